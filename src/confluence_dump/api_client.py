@@ -2,10 +2,70 @@
 Confluence REST API v2 client
 """
 
+import concurrent.futures
+import logging
 import os
-from typing import Any, Optional
+import shutil
+from typing import Any, BinaryIO, Iterator, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Optional faster JSON decoder, used when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Copy block size for attachment downloads; large blocks keep
+# read()/write() syscalls per file low for multi-MB images
+_DOWNLOAD_BUFFER_SIZE = 256 * 1024
+
+# Connection pool size when the caller doesn't know its concurrency
+DEFAULT_POOL_SIZE = 32
+
+
+def _decode_json(response: requests.Response) -> Any:
+    """
+    Decode JSON response body, with orjson when available
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            # e.g. lone surrogate escapes, which the stdlib decoder accepts
+            pass
+    return response.json()
+
+
+def create_http_adapter(pool_size: int = DEFAULT_POOL_SIZE) -> HTTPAdapter:
+    """
+    Create HTTP adapter shared by all requests of a session
+
+    The pool should be at least as large as the number of concurrent
+    requests, so connections (and their TLS handshakes) are reused instead
+    of discarded. Throttled (429) and transient server errors are retried
+    with backoff, honouring Retry-After; the final response is still
+    returned so callers see the usual HTTPError from raise_for_status().
+
+    Args:
+        pool_size: Maximum number of connections kept per host
+
+    Returns:
+        HTTPAdapter: Adapter to mount for http:// and https://
+    """
+    retries = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False,
+    )
+    return HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries
+    )
 
 
 class ConfluenceClient:
@@ -14,7 +74,11 @@ class ConfluenceClient:
     """
 
     def __init__(
-        self, base_url: Optional[str], email: Optional[str], api_token: Optional[str]
+        self,
+        base_url: Optional[str],
+        email: Optional[str],
+        api_token: Optional[str],
+        pool_size: int = DEFAULT_POOL_SIZE,
     ):
         """
         Initialize Confluence client
@@ -23,6 +87,8 @@ class ConfluenceClient:
             base_url: Confluence base URL (e.g., https://kinto-dev.atlassian.net)
             email: User email for authentication
             api_token: API token generated from Atlassian account settings
+            pool_size: Connection pool size, at least the number of requests
+                the caller makes concurrently
         """
         self.base_url = base_url.rstrip("/") if base_url else ""
         self.email = email if email else ""
@@ -31,6 +97,10 @@ class ConfluenceClient:
         self.session.auth = (self.email, self.api_token)
         self.session.headers.update({"Accept": "application/json"})
 
+        adapter = create_http_adapter(pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
     def get_page(self, page_id: str) -> dict[str, Any]:
         """
         Get single page content with body
@@ -45,84 +115,232 @@ class ConfluenceClient:
         response = self.session.get(url, timeout=30)
 
         response.raise_for_status()
-        return response.json()
+        return _decode_json(response)
 
-    def get_descendants(self, page_id: str) -> list[dict[str, Any]]:
+    def get_pages_bulk(self, page_ids: list[str]) -> dict[str, dict[str, Any]]:
         """
-        Get all descendant pages recursively
+        Get multiple pages with body in batched requests
+
+        Uses the pages listing endpoint filtered by ID (up to 250 IDs per
+        request); batches are fetched concurrently.
+
+        Args:
+            page_ids: Confluence page IDs
+
+        Returns:
+            dict: Page ID -> page data with 'body.storage' expanded.
+                IDs that are not pages (e.g. folders) are missing.
+        """
+        batch_size = 250
+        batches = [
+            page_ids[i : i + batch_size] for i in range(0, len(page_ids), batch_size)
+        ]
+        url = f"{self.base_url}/wiki/api/v2/pages"
+
+        def fetch_batch(batch: list[str]) -> list[dict[str, Any]]:
+            params = {"id": ",".join(batch), "body-format": "storage", "limit": batch_size}
+            return list(self._iter_paginated(url, params))
+
+        pages = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            for batch_pages in executor.map(fetch_batch, batches):
+                for page in batch_pages:
+                    pages[page["id"]] = page
+
+        return pages
+
+    def get_page_tree(self, page_id: str) -> list[dict[str, Any]]:
+        """
+        Get a page followed by all its descendants, with body where possible
+
+        The parent page is fetched concurrently with the descendants listing;
+        descendant bodies are then filled in with get_pages_bulk. If the bulk
+        request fails, descendants are returned without body.
 
         Args:
             page_id: Parent page ID
 
         Returns:
-            list: All descendant pages
+            list: Parent page first, then all descendant pages
         """
-        all_pages = []
-        cursor = None
+        # Parent page and descendants listing are independent requests
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            parent_future = executor.submit(self.get_page, page_id)
+            descendants = self.get_descendants(page_id)
 
-        while True:
-            params = {"limit": 100}
-            if cursor:
-                params["cursor"] = cursor
+            # Descendants listing has no body; fetch bodies in batches
+            # instead of one get_page call per page
+            try:
+                bodies = self.get_pages_bulk([page["id"] for page in descendants])
+                descendants = [bodies.get(page["id"], page) for page in descendants]
+            except requests.exceptions.HTTPError as e:
+                logger.warning(f"⚠ Warning: Failed to fetch page bodies in bulk ({e}), fetching per page")
 
-            url = f"{self.base_url}/wiki/api/v2/pages/{page_id}/descendants"
-            response = self.session.get(url, params=params, timeout=30)
+            parent_page = parent_future.result()
 
-            response.raise_for_status()
-            data = response.json()
+        return [parent_page] + descendants
+
+    def _iter_paginated(
+        self, url: str, params: dict[str, Any]
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Iterate over results of a cursor-paginated endpoint
+
+        The next page is requested in the background as soon as the current
+        one arrives, so its latency overlaps with processing of the current
+        results. If the caller stops early, the pending request is cancelled.
+
+        Args:
+            url: Endpoint URL of the first page
+            params: Query parameters of the first page
+
+        Yields:
+            dict: Items from the 'results' array of every page
+        """
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(self.session.get, url, params=params, timeout=30)
+        try:
+            while future is not None:
+                response = future.result()
+                response.raise_for_status()
+                data = _decode_json(response)
+
+                # Prefetch next page before handing out current results
+                # next link is relative to the site, e.g. /wiki/api/v2/...?cursor=...
+                future = None
+                next_link = data.get("_links", {}).get("next")
+                if next_link:
+                    future = executor.submit(
+                        self.session.get, f"{self.base_url}{next_link}", timeout=30
+                    )
+
+                yield from data.get("results", [])
+        finally:
+            if future is not None:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def iter_descendants(self, page_id: str) -> Iterator[dict[str, Any]]:
+        """
+        Iterate over all descendant pages, prefetching the next batch
 
-            all_pages.extend(data.get("results", []))
+        Args:
+            page_id: Parent page ID
 
-            # Check for next page
-            cursor = data.get("_links", {}).get("next")
-            if not cursor:
-                break
+        Yields:
+            dict: Descendant page
+        """
+        url = f"{self.base_url}/wiki/api/v2/pages/{page_id}/descendants"
+        yield from self._iter_paginated(url, {"limit": 100})
 
-        return all_pages
+    def get_descendants(self, page_id: str) -> list[dict[str, Any]]:
+        """
+        Get all descendant pages recursively
+
+        Args:
+            page_id: Parent page ID
 
-    def get_attachments(self, page_id: str) -> list[dict[str, Any]]:
+        Returns:
+            list: All descendant pages
+        """
+        return list(self.iter_descendants(page_id))
+
+    def iter_attachments(
+        self, page_id: str, messages: Optional[list[str]] = None
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Iterate over all attachments for a page, prefetching the next batch
+
+        Args:
+            page_id: Confluence page ID
+            messages: Optional list of the page's status lines to add
+                warnings to, instead of logging them right away
+
+        Yields:
+            dict: Attachment metadata including download links
+        """
+        url = f"{self.base_url}/wiki/api/v2/pages/{page_id}/attachments"
+        try:
+            yield from self._iter_paginated(url, {"limit": 100})
+        except requests.exceptions.HTTPError as e:
+            # If 400 or 404, it might mean no attachments or permission issue
+            # Log warning and stop with what we have
+            if e.response.status_code in [400, 404]:
+                warning = f"    ⚠ Warning: Failed to fetch attachments for page {page_id} (Status {e.response.status_code})"
+                if messages is None:
+                    logger.warning(warning)
+                else:
+                    messages.append(warning)
+                return
+            raise e
+
+    def get_attachments(
+        self, page_id: str, messages: Optional[list[str]] = None
+    ) -> list[dict[str, Any]]:
         """
         Get all attachments for a page
 
         Args:
             page_id: Confluence page ID
+            messages: Optional list of the page's status lines to add
+                warnings to, instead of logging them right away
 
         Returns:
             list: Attachment metadata including download links
         """
-        all_attachments = []
-        cursor = None
+        return list(self.iter_attachments(page_id, messages))
 
-        while True:
-            params = {"limit": 100}
-            if cursor:
-                params["cursor"] = cursor
+    def _attachment_url(self, download_link: str) -> str:
+        """
+        Build absolute URL for a relative attachment download link
+        """
+        # download_link is relative, need to prepend base_url/wiki
+        if download_link.startswith("/"):
+            return f"{self.base_url}/wiki{download_link}"
+        return f"{self.base_url}/wiki/{download_link}"
 
-            url = f"{self.base_url}/wiki/api/v2/pages/{page_id}/attachments"
-            try:
-                response = self.session.get(url, params=params, timeout=30)
-                response.raise_for_status()
-                data = response.json()
-            except requests.exceptions.HTTPError as e:
-                # If 400 or 404, it might mean no attachments or permission issue
-                # Log warning and return what we have
-                if e.response.status_code in [400, 404]:
-                    print(f"    ⚠ Warning: Failed to fetch attachments for page {page_id} (Status {e.response.status_code})")
-                    break
-                raise e
+    def download_attachment_to(self, download_link: str, fileobj: BinaryIO) -> None:
+        """
+        Stream attachment content into a writable binary file object
 
-            all_attachments.extend(data.get("results", []))
+        The raw response stream is copied in large blocks straight into
+        fileobj, without building the content as bytes in memory.
 
-            # Check for next page
-            cursor = data.get("_links", {}).get("next")
-            if not cursor:
-                break
+        Args:
+            download_link: Relative download link from attachment metadata
+            fileobj: Binary file object to write to
+        """
+        url = self._attachment_url(download_link)
 
-        return all_attachments
+        with self.session.get(url, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            # Still undo any Content-Encoding (e.g. gzip) while reading raw
+            response.raw.decode_content = True
+            shutil.copyfileobj(response.raw, fileobj, length=_DOWNLOAD_BUFFER_SIZE)
+
+    def download_attachment(self, download_link: str, dest_path: str) -> None:
+        """
+        Download attachment to a file using authenticated session
 
-    def download_attachment(self, download_link: str) -> bytes:
+        The response is streamed, so memory use does not grow with
+        attachment size. A partially written file is removed on failure.
+
+        Args:
+            download_link: Relative download link from attachment metadata
+            dest_path: Local file path to write to
+        """
+        try:
+            # Unbuffered: copyfileobj already hands over large blocks
+            with open(dest_path, "wb", buffering=0) as f:
+                self.download_attachment_to(download_link, f)
+        except BaseException:
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+            raise
+
+    def download_attachment_bytes(self, download_link: str) -> bytes:
         """
-        Download attachment content using authenticated session
+        Download attachment content into memory using authenticated session
 
         Args:
             download_link: Relative download link from attachment metadata
@@ -130,21 +348,21 @@ class ConfluenceClient:
         Returns:
             bytes: File content
         """
-        # download_link is relative, need to prepend base_url/wiki
-        if download_link.startswith("/"):
-            url = f"{self.base_url}/wiki{download_link}"
-        else:
-            url = f"{self.base_url}/wiki/{download_link}"
+        url = self._attachment_url(download_link)
 
         response = self.session.get(url, timeout=30)
         response.raise_for_status()
         return response.content
 
 
-def create_client_from_env() -> ConfluenceClient:
+def create_client_from_env(pool_size: int = DEFAULT_POOL_SIZE) -> ConfluenceClient:
     """
     Create Confluence client from environment variables
 
+    Args:
+        pool_size: Connection pool size, at least the number of requests
+            the caller makes concurrently
+
     Returns:
         ConfluenceClient: Configured client instance
 
@@ -161,4 +379,4 @@ def create_client_from_env() -> ConfluenceClient:
             "Please set CONFLUENCE_BASE_URL, CONFLUENCE_EMAIL, and CONFLUENCE_API_TOKEN."
         )
 
-    return ConfluenceClient(base_url, email, api_token)
+    return ConfluenceClient(base_url, email, api_token, pool_size)
@@ -2,10 +2,41 @@
 HTML to Markdown converter
 """
 
+import os
+import re
+from html import escape, unescape
 from bs4 import BeautifulSoup
 from typing import List, Tuple
 import markdownify
 
+# Optional native (Rust) HTML to Markdown backend, used when installed
+# Set CONFLUENCE_DUMP_CONVERTER=markdownify to force the pure-Python converter
+try:
+    import html_to_markdown as _native_md
+except ImportError:
+    _native_md = None
+
+# Prefer the C-based lxml parser, fall back to the stdlib parser if missing
+try:
+    import lxml  # noqa: F401
+
+    _PARSER = "lxml"
+except ImportError:
+    _PARSER = "html.parser"
+
+_CDATA = re.compile(r"<!\[CDATA\[(.*?)\]\]>", re.DOTALL)
+
+# Single-pass scan for referenced images:
+# - att: <ri:attachment ri:filename="xxx.png" .../>
+# - diag: diagramName parameter of a drawio macro (never crossing the macro's end tag)
+_IMAGE_REFS = re.compile(
+    r'<ri:attachment[^>]*ri:filename="(?P<att>[^"]+)"'
+    r'|<ac:structured-macro[^>]*ac:name="drawio"[^>]*>'
+    r'(?:(?!</ac:structured-macro>).)*?'
+    r'<ac:parameter ac:name="diagramName">(?P<diag>[^<]+)</ac:parameter>',
+    re.DOTALL,
+)
+
 
 def extract_confluence_images(html: str) -> List[str]:
     """
@@ -17,154 +48,163 @@ def extract_confluence_images(html: str) -> List[str]:
     Returns:
         list: List of attachment filenames referenced in the content
     """
-    import re
+    # Skip the scan when the page references no attachment or drawio diagram
+    if "<ri:attachment" not in html and 'ac:name="drawio"' not in html:
+        return []
+
+    # Attribute values are still entity-escaped in the raw HTML; decode only
+    # the matched names so they equal the attachment titles (e.g. "a&amp;b.png")
     filenames = []
+    for match in _IMAGE_REFS.finditer(html):
+        if match.group("att"):
+            filenames.append(unescape(match.group("att")))
+        else:
+            # The PNG preview of a drawio diagram is named {diagramName}.png
+            filenames.append(f"{unescape(match.group('diag'))}.png")
 
-    # 1. Find all ri:attachment tags with filename attribute
-    # Pattern: <ri:attachment ri:filename="xxx.png" .../>
-    pattern = r'<ri:attachment[^>]*ri:filename="([^"]+)"[^>]*/?>'
-    matches = re.findall(pattern, html)
-    filenames.extend(matches)
+    return list(dict.fromkeys(filenames))  # Remove duplicates, keep document order
 
-    # 2. Find all drawio macros and extract diagramName
-    # Pattern looks for ac:name="drawio" and then finds diagramName parameter inside
-    drawio_pattern = r'<ac:structured-macro[^>]*ac:name="drawio"[^>]*>.*?</ac:structured-macro>'
-    drawio_macros = re.findall(drawio_pattern, html, flags=re.DOTALL)
 
-    for macro in drawio_macros:
-        name_match = re.search(r'<ac:parameter ac:name="diagramName">([^<]+)</ac:parameter>', macro)
-        if name_match:
-            diagram_name = name_match.group(1)
-            filenames.append(f"{diagram_name}.png")
+def _parse_html(html: str) -> BeautifulSoup:
+    """
+    Parse Confluence storage HTML with the fastest available parser
 
-    return list(set(filenames))  # Remove duplicates
+    lxml's HTML parser does not understand CDATA sections, which Confluence
+    uses for code macro bodies, so they are turned into escaped text first.
+    """
+    if _PARSER == "lxml" and "<![CDATA[" in html:
+        html = _CDATA.sub(lambda match: escape(match.group(1), quote=False), html)
+    return BeautifulSoup(html, _PARSER)
 
 
-def convert_code_macros(html: str) -> str:
+def convert_code_macros(soup: BeautifulSoup) -> None:
     """
     Convert Confluence code macros to standard HTML pre/code tags
 
     Args:
-        html: HTML content with code macros
-
-    Returns:
-        str: HTML with code macros converted
+        soup: Parsed HTML content, modified in place
     """
-    import re
-
-    def replace_code_block(match):
-        full_tag = match.group(0)
-
-        # Extract language
-        lang_match = re.search(r'<ac:parameter ac:name="language">([^<]+)</ac:parameter>', full_tag)
-        language = lang_match.group(1) if lang_match else ""
-
-        # Extract content from plain-text-body
+    for macro in soup.find_all("ac:structured-macro", attrs={"ac:name": "code"}):
         # Content is usually in CDATA: <ac:plain-text-body><![CDATA[...]]></ac:plain-text-body>
         # Or just text if no CDATA
-        body_match = re.search(r'<ac:plain-text-body>(.*?)</ac:plain-text-body>', full_tag, flags=re.DOTALL)
+        body = macro.find("ac:plain-text-body")
+        if body is None:
+            continue  # Keep original if parsing fails
 
-        if body_match:
-            content = body_match.group(1)
-            # Remove CDATA wrapper if present
-            if content.startswith("<![CDATA[") and content.endswith("]]>"):
-                content = content[9:-3]
-
-            # Construct Markdown-friendly HTML
-            # Markdownify handles <pre><code class="language-xyz"> well
-            class_attr = f' class="language-{language}"' if language else ""
-            return f'<pre><code{class_attr}>{content}</code></pre>'
-
-        return full_tag  # Return original if parsing fails
-
-    # Replace all code macros
-    pattern = r'<ac:structured-macro[^>]*ac:name="code"[^>]*>.*?</ac:structured-macro>'
-    result = re.sub(pattern, replace_code_block, html, flags=re.DOTALL)
+        # Extract language
+        lang_param = macro.find("ac:parameter", attrs={"ac:name": "language"})
+        language = lang_param.get_text() if lang_param else ""
 
-    return result
+        # Construct Markdown-friendly HTML
+        # Markdownify handles <pre><code class="language-xyz"> well
+        code = soup.new_tag("code")
+        if language:
+            code["class"] = f"language-{language}"
+        code.string = body.get_text()
+        pre = soup.new_tag("pre")
+        pre.append(code)
+        macro.replace_with(pre)
 
 
-def convert_confluence_images(html: str, image_map: dict[str, str]) -> str:
+def convert_confluence_images(soup: BeautifulSoup, image_map: dict[str, str]) -> List[str]:
     """
     Convert Confluence ac:image tags to standard img tags
 
     Args:
-        html: HTML content with ac:image tags
+        soup: Parsed HTML content, modified in place
         image_map: Mapping of filename -> local_path
 
     Returns:
-        str: HTML with ac:image converted to standard img tags
+        list: Attachment filenames of the converted images
     """
-    import re
-
-    def replace_ac_image(match):
-        full_tag = match.group(0)
-
-        # Extract alt text
-        alt_match = re.search(r'ac:alt="([^"]+)"', full_tag)
-        alt = alt_match.group(1) if alt_match else ""
-
+    filenames = []
+    for image in soup.find_all("ac:image"):
         # Extract filename from ri:attachment
-        filename_match = re.search(r'ri:filename="([^"]+)"', full_tag)
-        if filename_match:
-            filename = filename_match.group(1)
-            # Use local path if available, otherwise use filename
-            src = image_map.get(filename, f"images/{filename}")
-            return f'<img src="{src}" alt="{alt}" />'
-
-        return ""  # Remove if no filename found
+        attachment = image.find("ri:attachment")
+        filename = attachment.get("ri:filename") if attachment else None
+        if not filename:
+            image.decompose()  # Remove if no filename found
+            continue
 
-    # Replace all ac:image tags
-    pattern = r'<ac:image[^>]*>.*?</ac:image>'
-    result = re.sub(pattern, replace_ac_image, html, flags=re.DOTALL)
+        # Use local path if available, otherwise use filename
+        src = image_map.get(filename, f"images/{filename}")
+        alt = image.get("ac:alt", "")
+        image.replace_with(soup.new_tag("img", src=src, alt=alt))
+        filenames.append(filename)
 
-    return result
+    return filenames
 
 
-def convert_drawio_macros(html: str, image_map: dict[str, str]) -> str:
+def convert_drawio_macros(soup: BeautifulSoup, image_map: dict[str, str]) -> List[str]:
     """
     Convert Confluence drawio macros to standard img tags
 
     Drawio macros have a corresponding .drawio.png preview file as attachment.
 
     Args:
-        html: HTML content with drawio macros
+        soup: Parsed HTML content, modified in place
         image_map: Mapping of filename -> local_path
 
     Returns:
-        str: HTML with drawio macros converted to img tags
+        list: PNG preview filenames of the converted diagrams
     """
-    import re
+    filenames = []
+    for macro in soup.find_all("ac:structured-macro", attrs={"ac:name": "drawio"}):
+        # Extract diagram name from diagramName parameter
+        name_param = macro.find("ac:parameter", attrs={"ac:name": "diagramName"})
+        if name_param is None or not name_param.get_text():
+            macro.decompose()  # Remove if no diagram name found
+            continue
 
-    def replace_drawio(match):
-        full_tag = match.group(0)
+        diagram_name = name_param.get_text()
+        # The PNG preview file is named {diagramName}.png
+        png_filename = f"{diagram_name}.png"
 
-        # Extract diagram name from diagramName parameter
-        name_match = re.search(r'<ac:parameter ac:name="diagramName">([^<]+)</ac:parameter>', full_tag)
-        if name_match:
-            diagram_name = name_match.group(1)
-            # The PNG preview file is named {diagramName}.png
-            png_filename = f"{diagram_name}.png"
+        # Use local path if available
+        src = image_map.get(png_filename, f"images/{png_filename}")
+        macro.replace_with(soup.new_tag("img", src=src, alt=diagram_name))
+        filenames.append(png_filename)
 
-            # Use local path if available
-            src = image_map.get(png_filename, f"images/{png_filename}")
-            alt = diagram_name
+    return filenames
 
-            return f'<img src="{src}" alt="{alt}" />'
 
-        return ""  # Remove if no diagram name found
+def _convert_html_to_md(soup: BeautifulSoup) -> str:
+    """
+    Convert parsed HTML to Markdown with the fastest available backend
 
-    # Replace all drawio macros
-    pattern = r'<ac:structured-macro[^>]*ac:name="drawio"[^>]*>.*?</ac:structured-macro>'
-    result = re.sub(pattern, replace_drawio, html, flags=re.DOTALL)
+    Args:
+        soup: Parsed HTML content
 
-    return result
+    Returns:
+        str: Markdown text with ATX headings and '*' bullets
+    """
+    if _native_md is not None and os.getenv("CONFLUENCE_DUMP_CONVERTER") != "markdownify":
+        try:
+            options = _native_md.ConversionOptions(
+                heading_style="atx",
+                bullets="*",
+                strip_tags=["script", "style"],
+                extract_metadata=False,
+            )
+            return _native_md.convert(str(soup), options).content
+        except Exception:
+            # Optional backend with an incompatible API or a conversion
+            # error: fall back to markdownify rather than failing the page
+            pass
+
+    converter = markdownify.MarkdownConverter(
+        heading_style="ATX", bullets="*", strip=["script", "style"]
+    )
+    return converter.convert_soup(soup)
 
 
 def html_to_markdown(html: str, image_map: dict[str, str] = None) -> Tuple[str, List[str]]:
     """
     Convert Confluence HTML to Markdown
 
+    The HTML is parsed once; all Confluence-specific transformations are
+    applied to the same tree, which is then handed to markdownify directly.
+
     Args:
         html: HTML content from Confluence
         image_map: Optional mapping of filename -> local_path for images
@@ -175,32 +215,21 @@ def html_to_markdown(html: str, image_map: dict[str, str] = None) -> Tuple[str,
     if image_map is None:
         image_map = {}
 
-    # 1. Extract Confluence image filenames
-    image_filenames = extract_confluence_images(html)
+    soup = _parse_html(html)
 
-    # 2. Convert Confluence ac:image tags to standard img tags
-    html = convert_confluence_images(html, image_map)
+    # 1. Convert Confluence ac:image tags to standard img tags
+    image_filenames = convert_confluence_images(soup, image_map)
 
-    # 3. Convert drawio macros to standard img tags
-    html = convert_drawio_macros(html, image_map)
+    # 2. Convert drawio macros to standard img tags
+    image_filenames += convert_drawio_macros(soup, image_map)
 
-    # 4. Convert code macros to standard HTML pre/code tags
-    html = convert_code_macros(html)
-
-    # 5. Also extract standard img URLs
-    soup = BeautifulSoup(html, "html.parser")
-    image_urls = []
-    for img in soup.find_all("img"):
-        src = img.get("src")
-        if src:
-            image_urls.append(src)
+    # 3. Convert code macros to standard HTML pre/code tags
+    convert_code_macros(soup)
 
     # 4. Convert to Markdown
-    markdown = markdownify.markdownify(
-        html, heading_style="ATX", bullets="*", strip=["script", "style"]
-    )
+    markdown = _convert_html_to_md(soup)
 
-    return markdown, image_filenames
+    return markdown, list(dict.fromkeys(image_filenames))
 
 
 def rewrite_image_links(markdown: str, image_map: dict[str, str]) -> str:
@@ -214,7 +243,12 @@ def rewrite_image_links(markdown: str, image_map: dict[str, str]) -> str:
     Returns:
         str: Markdown with rewritten image links
     """
-    result = markdown
-    for original_url, local_path in image_map.items():
-        result = result.replace(original_url, local_path)
-    return result
+    if not image_map:
+        return markdown
+
+    # Single pass over the text; longest URLs first so a shorter URL
+    # that is a prefix of a longer one cannot mask it
+    pattern = re.compile(
+        "|".join(re.escape(url) for url in sorted(image_map, key=len, reverse=True))
+    )
+    return pattern.sub(lambda match: image_map[match.group(0)], markdown)
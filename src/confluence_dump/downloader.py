@@ -4,10 +4,21 @@ Image downloader
 
 import os
 import re
+import shutil
+import hashlib
+import threading
 from urllib.parse import urlparse
 import requests
 from typing import Dict
 import concurrent.futures
+import logging
+
+from confluence_dump.api_client import ConfluenceClient, create_http_adapter
+
+logger = logging.getLogger(__name__)
+
+# Concurrent downloads per page
+DOWNLOAD_WORKERS = 5
 
 
 class ImageDownloader:
@@ -15,17 +26,22 @@ class ImageDownloader:
     Download images from Confluence and save locally
     """
 
-    def __init__(self, output_dir: str, max_workers: int = 5):
+    def __init__(self, output_dir: str, max_workers: int = DOWNLOAD_WORKERS, cache_dir: str | None = None):
         """
         Initialize downloader
 
         Args:
             output_dir: Directory to save images
             max_workers: Maximum concurrent download threads
+            cache_dir: Optional existing directory of downloaded attachments,
+                shared between pages and runs
         """
         self.output_dir = output_dir
         self.max_workers = max_workers
-        self.session = requests.Session()
+        self.cache_dir = cache_dir
+        # Only needed for plain URL downloads, created by download_images;
+        # attachments are downloaded with the client's session
+        self.session: requests.Session | None = None
 
     def _generate_filename(self, url: str) -> str:
         """
@@ -70,7 +86,7 @@ class ImageDownloader:
             return url, local_path
 
         except Exception as e:
-            print(f"Warning: Failed to download {url}: {e}")
+            logger.warning(f"Warning: Failed to download {url}: {e}")
             return url, None
 
     def download_images(self, urls: list[str]) -> dict[str, str]:
@@ -86,6 +102,12 @@ class ImageDownloader:
         if not urls:
             return {}
 
+        if self.session is None:
+            self.session = requests.Session()
+            adapter = create_http_adapter(self.max_workers)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+
         # Create output directory
         os.makedirs(self.output_dir, exist_ok=True)
 
@@ -106,6 +128,91 @@ class ImageDownloader:
                     if local_path:
                         image_map[downloaded_url] = local_path
                 except Exception as e:
-                    print(f"Warning: Download failed for {url}: {e}")
+                    logger.warning(f"Warning: Download failed for {url}: {e}")
 
         return image_map
+
+    def _download_attachment(
+        self, client: ConfluenceClient, filename: str, download_link: str
+    ) -> str:
+        """
+        Download single Confluence attachment with the client's authenticated session
+
+        Returns:
+            str: Local path of the attachment
+        """
+        local_path = os.path.join(self.output_dir, filename)
+
+        if self.cache_dir is None:
+            # Check if already exists
+            if not os.path.exists(local_path):
+                client.download_attachment(download_link, local_path)
+            return local_path
+
+        # The download link carries the attachment version, so a new
+        # upload gets a new cache key and replaces the page's old copy
+        key = hashlib.sha256(download_link.encode("utf-8")).hexdigest()
+        blob_path = os.path.join(self.cache_dir, key + os.path.splitext(filename)[1])
+        if not os.path.exists(blob_path):
+            tmp_path = f"{blob_path}.{threading.get_ident()}.tmp"
+            client.download_attachment(download_link, tmp_path)
+            os.replace(tmp_path, blob_path)
+
+        if os.path.exists(local_path) and os.path.samefile(blob_path, local_path):
+            return local_path
+
+        # Link under a temp name and swap it in, replacing any outdated file
+        tmp_path = f"{local_path}.{threading.get_ident()}.tmp"
+        try:
+            os.link(blob_path, tmp_path)
+        except OSError:
+            # Hard links unsupported (e.g. cross-device); fall back to a copy
+            shutil.copyfile(blob_path, tmp_path)
+        os.replace(tmp_path, local_path)
+        return local_path
+
+    def download_attachments(
+        self,
+        client: ConfluenceClient,
+        tasks: list[tuple[str, str]],
+        messages: list[str] | None = None,
+    ) -> dict[str, str]:
+        """
+        Download multiple Confluence attachments concurrently
+
+        Args:
+            client: Confluence API client used for authenticated downloads
+            tasks: List of (filename, download_link) pairs
+            messages: Optional list of the page's status lines to add
+                warnings to, instead of logging them right away
+
+        Returns:
+            dict: Mapping of filename -> local_path for successful downloads
+        """
+        if not tasks:
+            return {}
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        downloaded = {}
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers
+        ) as executor:
+            future_to_filename = {
+                executor.submit(self._download_attachment, client, filename, link): filename
+                for filename, link in tasks
+            }
+
+            for future in concurrent.futures.as_completed(future_to_filename):
+                filename = future_to_filename[future]
+                try:
+                    downloaded[filename] = future.result()
+                except Exception as e:
+                    warning = f"    ⚠ Failed to download {filename}: {e}"
+                    if messages is None:
+                        logger.warning(warning)
+                    else:
+                        messages.append(warning)
+
+        return downloaded
@@ -5,7 +5,13 @@ Confluence Dump CLI - Export Confluence pages to Markdown for LLM context
 import os
 import sys
 import re
+import json
+import logging
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
+from typing import Optional
 
 import click
 from dotenv import load_dotenv
@@ -15,7 +21,32 @@ from confluence_dump import __version__
 from confluence_dump.url_parser import parse_confluence_url
 from confluence_dump.api_client import ConfluenceClient, create_client_from_env
 from confluence_dump.converter import html_to_markdown, rewrite_image_links, extract_confluence_images
-from confluence_dump.downloader import ImageDownloader
+from confluence_dump.downloader import DOWNLOAD_WORKERS, ImageDownloader
+
+# Package logger; named explicitly so it is also right when run as __main__
+logger = logging.getLogger("confluence_dump")
+
+
+# Symbols < > : " | ? * \ / and control chars (ASCII 0-31), removed in one pass
+_INVALID_CHARS = re.compile(r'[<>:"|?*\\/\x00-\x1f]')
+_WHITESPACE = re.compile(r"\s+")
+
+# Environment variables read by create_client_from_env
+_CREDENTIAL_VARS = ("CONFLUENCE_BASE_URL", "CONFLUENCE_EMAIL", "CONFLUENCE_API_TOKEN")
+
+# Attachment types downloaded as images
+_IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp")
+
+# File buffer for exported files (large blocks, fewer write syscalls)
+_WRITE_BUFFER_SIZE = 256 * 1024
+
+# Per-page record of the exported version, used to skip unchanged pages on re-runs
+MANIFEST_NAME = ".manifest.json"
+
+# Directory under the output root holding downloaded attachments, keyed by a
+# hash of their versioned download link and hard-linked into page folders, so
+# re-exports and images shared between pages skip the download
+CACHE_DIR_NAME = ".cache"
 
 
 def sanitize_filename(name: str) -> str:
@@ -23,15 +54,102 @@ def sanitize_filename(name: str) -> str:
     Remove invalid filename characters while preserving as much as possible
     Only removes characters that are truly invalid in filenames
     """
-    # 1. Remove symbols: < > : " | ? * \ /
-    sanitized = re.sub(r'[<>:"|?*\\/]', "", name)
+    sanitized = _INVALID_CHARS.sub("", name)
+    sanitized = _WHITESPACE.sub(" ", sanitized).strip()
+    return sanitized if sanitized else "Untitled"
 
-    # 2. Remove control chars (ASCII 0-31)
-    # Use non-raw string to interpret \x00-\x1f as actual control chars
-    sanitized = re.sub('[\x00-\x1f]', "", sanitized)
 
-    sanitized = re.sub(r"\s+", " ", sanitized).strip()
-    return sanitized if sanitized else "Untitled"
+# Directories known to exist, so bulk exports don't re-probe them per page
+_made_dirs: set[str] = set()
+
+
+def _ensure_dir(path: str) -> None:
+    """
+    Create directory (and parents) unless it is already known to exist
+
+    When the parent is known to exist, a single mkdir call is enough.
+    """
+    if path in _made_dirs:
+        return
+    if os.path.dirname(path) in _made_dirs:
+        try:
+            os.mkdir(path)
+        except FileExistsError:
+            pass
+    else:
+        os.makedirs(path, exist_ok=True)
+    _made_dirs.add(path)
+
+
+def _scan_existing_dirs(output_dir: str) -> None:
+    """
+    Record output_dir and its existing page folders with a single scandir
+    """
+    _made_dirs.add(output_dir)
+    with os.scandir(output_dir) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                _made_dirs.add(entry.path)
+
+
+def _write_chunks(path: str, chunks: list[bytes]) -> None:
+    """
+    Write byte chunks to a file without joining them first
+
+    Uses a single vectored write (os.writev) where available, looping only
+    on partial writes; falls back to sequential writes elsewhere.
+    """
+    if not hasattr(os, "writev"):
+        with open(path, "wb", buffering=_WRITE_BUFFER_SIZE) as f:
+            for chunk in chunks:
+                f.write(chunk)
+        return
+
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        views = [memoryview(chunk) for chunk in chunks if chunk]
+        while views:
+            written = os.writev(fd, views)
+            while views and written >= len(views[0]):
+                written -= len(views.pop(0))
+            if views and written:
+                views[0] = views[0][written:]
+    finally:
+        os.close(fd)
+
+
+def load_manifest(page_dir: str) -> dict:
+    """
+    Load export manifest of a page folder
+
+    Returns:
+        dict: Manifest data, or empty dict if missing or unreadable
+    """
+    try:
+        with open(os.path.join(page_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(page_dir: str, manifest: dict) -> None:
+    """
+    Save export manifest of a page folder (atomically)
+    """
+    manifest_path = os.path.join(page_dir, MANIFEST_NAME)
+    tmp_path = f"{manifest_path}.tmp"
+    Path(tmp_path).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp_path, manifest_path)
+
+
+def remove_manifest(page_dir: str) -> None:
+    """
+    Remove export manifest of a page folder, if any
+    """
+    try:
+        os.remove(os.path.join(page_dir, MANIFEST_NAME))
+    except FileNotFoundError:
+        pass
 
 
 def export_page(
@@ -43,6 +161,9 @@ def export_page(
     include_images: bool = True,
     all_attachments: bool = False,
     debug: bool = False,
+    convert_executor: Optional[concurrent.futures.Executor] = None,
+    cache_dir: Optional[str] = None,
+    unresolved: Optional[set] = None,
 ) -> bool:
     """
     Export single page to Markdown with images
@@ -56,47 +177,103 @@ def export_page(
         include_images: Whether to download images
         all_attachments: Whether to download all attachments regardless of usage
         debug: Whether to save raw HTML for debugging
+        convert_executor: Optional executor (e.g. a process pool) to run the
+            CPU-bound HTML to Markdown conversion on; runs inline if None
+        cache_dir: Optional existing attachment cache directory shared between pages
+        unresolved: Optional set to add referenced attachment names to that
+            were found neither on the page nor in the global pool
 
     Returns:
         bool: True if successful, False otherwise
     """
+    # Status lines are collected and logged once per page, so concurrent
+    # exports don't interleave and each page costs a single console write
+    messages = []
     try:
         title = page_data.get("title", "Untitled")
 
-        # If page_data doesn't have body content, fetch it from API
+        # 5. Folder naming: {page_id}_{title}
+        safe_title = sanitize_filename(title)
+        folder_name = f"{page_id}_{safe_title}"
+        page_dir = os.path.join(output_dir, folder_name)
+
+        # 6. Incremental export: skip pages whose version was already exported
+        #    with the same options, without any API call
+        version = page_data.get("version", {}).get("number")
+        options = {
+            "include_images": include_images,
+            "all_attachments": all_attachments,
+            "debug": debug,
+        }
+        if version is not None:
+            manifest = load_manifest(page_dir)
+            if (
+                manifest.get("version") == version
+                and manifest.get("options") == options
+                and os.path.exists(os.path.join(page_dir, "README.md"))
+            ):
+                # Other pages may still reference this page's attachments
+                global_attachment_pool.update(manifest.get("attachments", {}))
+                messages.append(f"  → Up to date: {title}")
+                return True
+
+        # Descendants may be folders, whiteboards, databases, ...: they have
+        # no storage body, skip them without any API call
+        content_type = page_data.get("type", "page")
+        if content_type != "page":
+            messages.append(f"  → Skipping {content_type}: {title}")
+            return True
+
+        # If page_data doesn't have body content, fetch it from API.
+        # Only a missing body needs a request; an empty one is skipped below
         html_content = page_data.get("body", {}).get("storage", {}).get("value")
+        attachments_future = None
+        # Attachment warnings, added after the page's "Exporting" line
+        attachment_warnings = []
         if html_content is None:
-            # Fetch full page content from API
-            full_page = client.get_page(page_id)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+                # Attachments metadata doesn't depend on the body, overlap both requests
+                if include_images:
+                    attachments_future = executor.submit(
+                        client.get_attachments, page_id, attachment_warnings
+                    )
+
+                # Fetch full page content from API
+                full_page = client.get_page(page_id)
             html_content = full_page.get("body", {}).get("storage", {}).get("value", "")
+            version = full_page.get("version", {}).get("number")
 
         # 1. Skip empty content
         if not html_content or not html_content.strip():
-            print(f"  → Skipping empty page: {title}")
+            messages.append(f"  → Skipping empty page: {title}")
             return True
 
-        print(f"  → Exporting: {title}")
+        messages.append(f"  → Exporting: {title}")
 
-        # 5. Folder naming: {page_id}_{title}
-        safe_title = sanitize_filename(title)
-        folder_name = f"{page_id}_{safe_title}"
-        page_dir = os.path.join(output_dir, folder_name)
-        os.makedirs(page_dir, exist_ok=True)
+        _ensure_dir(page_dir)
 
         # 4. Debug mode: Save raw HTML
         if debug:
             raw_path = os.path.join(page_dir, "raw.html")
-            with open(raw_path, "w", encoding="utf-8") as f:
+            with open(raw_path, "w", encoding="utf-8", buffering=_WRITE_BUFFER_SIZE) as f:
                 f.write(html_content)
-            print(f"    ✓ Debug: Saved raw HTML to {raw_path}")
+            messages.append(f"    ✓ Debug: Saved raw HTML to {raw_path}")
 
         # 2. Selective attachment downloading
         image_map = {}
+        attachment_map = {}
+        # Only a page with all its images is recorded as up to date
+        complete = True
         if include_images:
             try:
                 # Get all attachments metadata
-                attachments = client.get_attachments(page_id)
+                if attachments_future is not None:
+                    attachments = attachments_future.result()
+                else:
+                    attachments = client.get_attachments(page_id, attachment_warnings)
+                messages.extend(attachment_warnings)
                 attachment_map = {}
+                used_attachments = []
                 for att in attachments:
                     filename = att.get("title", "")
                     download_link = att.get("downloadLink", "")
@@ -118,8 +295,9 @@ def export_page(
 
                 if used_attachments:
                     image_dir = os.path.join(page_dir, "images")
-                    os.makedirs(image_dir, exist_ok=True)
+                    _ensure_dir(image_dir)
 
+                    download_tasks = []
                     for filename in used_attachments:
                         # Try current page attachments first, then global pool
                         download_link = attachment_map.get(filename)
@@ -127,53 +305,104 @@ def export_page(
                              download_link = global_attachment_pool.get(filename)
                         
                         if not download_link:
-                            # Still not found
+                            # Still not found; it may be attached to a page not
+                            # listed yet, so don't record this page as complete
+                            complete = False
+                            if unresolved is not None:
+                                unresolved.add(filename)
                             continue
 
                         # Only download image files
-                        if any(
-                            filename.lower().endswith(ext)
-                                for ext in [
-                                    ".png",
-                                    ".jpg",
-                                    ".jpeg",
-                                    ".gif",
-                                    ".svg",
-                                    ".webp",
-                                ]
-                            ):
-                                try:
-                                    content = client.download_attachment(download_link)
-                                    local_path = os.path.join(image_dir, filename)
-                                    with open(local_path, "wb") as f:
-                                        f.write(content)
-                                    # Store relative path for markdown
-                                    image_map[filename] = f"images/{filename}"
-                                except Exception as e:
-                                    print(f"    ⚠ Failed to download {filename}: {e}")
-
-                        if image_map:
-                            print(f"    ✓ Downloaded {len(image_map)} images")
+                        if filename.lower().endswith(_IMAGE_EXTS):
+                            download_tasks.append((filename, download_link))
+
+                    downloader = ImageDownloader(image_dir, cache_dir=cache_dir)
+                    downloaded = downloader.download_attachments(
+                        client, download_tasks, messages
+                    )
+                    for filename in downloaded:
+                        # Store relative path for markdown
+                        image_map[filename] = f"images/{filename}"
+                    if len(downloaded) < len(download_tasks):
+                        complete = False
+
+                    if image_map:
+                        messages.append(f"    ✓ Downloaded {len(image_map)} images")
             except Exception as e:
-                print(f"    ⚠ Failed to process attachments: {e} - Proceeding with markdown generation only.")
+                complete = False
+                messages.append(f"    ⚠ Failed to process attachments: {e} - Proceeding with markdown generation only.")
 
         # Convert HTML to Markdown with image mapping
-        markdown, _ = html_to_markdown(html_content, image_map)
-
-        # Prepend title as H1
-        markdown = f"# {title}\n\n{markdown}"
-
+        markdown = None
+        if convert_executor is not None:
+            try:
+                markdown, _ = convert_executor.submit(
+                    html_to_markdown, html_content, image_map
+                ).result()
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); the pool is unusable
+                # from now on, so convert this and later pages in-process
+                messages.append("    ⚠ Conversion process pool broken, converting in-process")
+        if markdown is None:
+            markdown, _ = html_to_markdown(html_content, image_map)
+
+        # Write title as H1 followed by the body, to a temp file swapped in
+        # afterwards so an interrupted run never leaves a truncated README.md.
+        # Each part is encoded once; errors="replace" keeps stray surrogates
+        # from the API (valid JSON escapes, invalid UTF-8) from failing the page
         md_path = os.path.join(page_dir, "README.md")
-        with open(md_path, "w", encoding="utf-8") as f:
-            f.write(markdown)
+        tmp_path = f"{md_path}.tmp"
+        header = f"# {title}\n\n".encode("utf-8", errors="replace")
+        body = markdown.encode("utf-8", errors="replace")
+        _write_chunks(tmp_path, [header, body])
+        os.replace(tmp_path, md_path)
+
+        if version is not None and complete:
+            save_manifest(
+                page_dir,
+                {
+                    "version": version,
+                    "options": options,
+                    "attachments": attachment_map,
+                    "images": image_map,
+                },
+            )
+        else:
+            # Drop any earlier manifest so the page is exported again next run
+            remove_manifest(page_dir)
 
-        print(f"    ✓ Saved: {md_path}")
+        messages.append(f"    ✓ Saved: {md_path}")
         return True
 
     except Exception as e:
-        print(f"  ✗ Failed to export page: {e}")
+        messages.append(f"  ✗ Failed to export page: {e}")
         return False
 
+    finally:
+        logger.info("\n".join(messages))
+
+
+def setup_logging(verbose: bool) -> None:
+    """
+    Route confluence_dump log records to the console as plain messages
+
+    Progress and warnings go to stdout, errors to stderr.
+
+    Args:
+        verbose: Whether to include debug messages
+    """
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    stdout_handler.addFilter(lambda record: record.levelno < logging.ERROR)
+    stderr_handler = logging.StreamHandler(sys.stderr)
+    stderr_handler.setLevel(logging.ERROR)
+
+    for handler in (stdout_handler, stderr_handler):
+        handler.setFormatter(logging.Formatter("%(message)s"))
+
+    logger.handlers = [stdout_handler, stderr_handler]
+    logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+    logger.propagate = False
+
 
 @click.command()
 @click.argument("url")
@@ -214,6 +443,15 @@ def export_page(
     default=False,
     help="Enable debug mode (saves raw HTML)",
 )
+@click.option(
+    "-j",
+    "--jobs",
+    "--workers",
+    "jobs",
+    default=8,
+    type=click.IntRange(min=1),
+    help="Number of pages to export concurrently (default: 8)",
+)
 @click.option("-v", "--verbose/--no-verbose", default=False, help="Verbose output")
 @click.version_option(__version__, prog_name="confluence-dump")
 def main(
@@ -224,6 +462,7 @@ def main(
     include_images: bool,
     all_attachments: bool,
     debug: bool,
+    jobs: int,
     verbose: bool,
 ):
     """
@@ -232,78 +471,132 @@ def main(
     Example:
         confluence-dump https://kinto-dev.atlassian.net/wiki/pages/viewpage.action?pageId=3140419873
     """
-    if verbose:
-        print(f"DEBUG: Original URL: {url}")
+    setup_logging(verbose)
 
-    try:
-        load_dotenv()
+    logger.debug(f"DEBUG: Original URL: {url}")
 
+    try:
         site, page_id = parse_confluence_url(url)
 
-        if verbose:
-            print(f"DEBUG: Parsed site: {site}")
-            print(f"DEBUG: Parsed page ID: {page_id}")
+        # Only read .env when the credentials aren't already in the environment
+        if not all(os.getenv(name) for name in _CREDENTIAL_VARS):
+            load_dotenv()
+
+        logger.debug(f"DEBUG: Parsed site: {site}")
+        logger.debug(f"DEBUG: Parsed page ID: {page_id}")
 
-        client = create_client_from_env()
+        # Each export thread downloads a page's images on its own threads;
+        # a few more connections cover listing prefetches and bulk fetches
+        client = create_client_from_env(pool_size=jobs * DOWNLOAD_WORKERS + 4)
 
         output_path = Path(output)
         output_path.mkdir(parents=True, exist_ok=True)
+        _scan_existing_dirs(str(output_path))
 
-        print(f"\n📚 Confluence Dump Tool")
-        print(f"═════════════════════════\n")
+        logger.info(f"\n📚 Confluence Dump Tool")
+        logger.info(f"═════════════════════════\n")
 
         pages = []
         if recursive:
-            print(f"🔍 Fetching all descendant pages...")
-            all_pages = client.get_descendants(page_id)
-            parent_page = client.get_page(page_id)
-            pages = [parent_page] + all_pages
-            print(f"✓ Found {len(pages)} pages total")
+            logger.info(f"🔍 Fetching all descendant pages...")
+            pages = client.get_page_tree(page_id)
+            logger.info(f"✓ Found {len(pages)} pages total")
         else:
-            print(f"🔍 Fetching single page...")
+            logger.info(f"🔍 Fetching single page...")
             page_data = client.get_page(page_id)
             pages = [page_data]
-            print(f"✓ Found page: {page_data.get('title')}")
+            logger.info(f"✓ Found page: {page_data.get('title')}")
 
-        print(f"\n📥 Exporting to: {output_path.absolute()}\n")
+        logger.info(f"\n📥 Exporting to: {output_path.absolute()}\n")
 
-        global_attachment_pool = {}
-        success_count = 0
-        skip_count = 0
-        for page_data in pages:
-            # We need to know if it was skipped or successful
-            # Since export_page returns True for skipped empty pages, success_count will include them
-            # Let's adjust slightly or just keep it simple.
-            if export_page(
-                client,
-                page_data["id"],
-                str(output_path),
-                page_data,
-                global_attachment_pool=global_attachment_pool,
-                include_images=include_images,
-                all_attachments=all_attachments,
-                debug=debug,
-            ):
-                success_count += 1
+        cache_dir = None
+        if include_images:
+            cache_dir = os.path.join(str(output_path), CACHE_DIR_NAME)
+            _ensure_dir(cache_dir)
+
+        # Network I/O runs on threads; HTML parsing and Markdown conversion
+        # hold the GIL, so with several pages they run on a process pool.
+        # Workers are started by a forkserver (or spawned) rather than forked,
+        # as the first conversion is submitted from an export thread
+        convert_workers = min(jobs, os.cpu_count() or 1, len(pages))
+        convert_executor = None
+        if convert_workers > 1:
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            convert_executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=convert_workers,
+                mp_context=multiprocessing.get_context(start_method),
+            )
 
-        print(f"\n✅ Export completed!")
-        print(f"   Total: {len(pages)} pages")
-        print(f"   Processed: {success_count} pages")
-        print(f"   Failed: {len(pages) - success_count} pages")
-        print(f"\n📁 Output: {output_path.absolute()}")
+        global_attachment_pool = {}
+        # Attachment names each page could not resolve when it was exported
+        unresolved = {page_data["id"]: set() for page_data in pages}
+        results = {}
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+
+                def submit(page_data: dict) -> concurrent.futures.Future:
+                    return executor.submit(
+                        export_page,
+                        client,
+                        page_data["id"],
+                        str(output_path),
+                        page_data,
+                        global_attachment_pool=global_attachment_pool,
+                        include_images=include_images,
+                        all_attachments=all_attachments,
+                        debug=debug,
+                        convert_executor=convert_executor,
+                        cache_dir=cache_dir,
+                        unresolved=unresolved[page_data["id"]],
+                    )
+
+                def export_all(batch: list[dict]) -> None:
+                    future_to_id = {submit(page_data): page_data["id"] for page_data in batch}
+                    for future in concurrent.futures.as_completed(future_to_id):
+                        results[future_to_id[future]] = future.result()
+
+                # Export the root page first: descendants commonly reference its
+                # attachments through the global pool
+                export_all(pages[:1])
+                export_all(pages[1:])
+
+                # Pages exported concurrently may have referenced attachments of
+                # pages not listed yet; now that every page has filled the pool,
+                # export those pages again
+                retry = [
+                    page_data
+                    for page_data in pages
+                    if any(name in global_attachment_pool for name in unresolved[page_data["id"]])
+                ]
+                for page_data in retry:
+                    unresolved[page_data["id"]].clear()
+                export_all(retry)
+        finally:
+            if convert_executor is not None:
+                convert_executor.shutdown()
+
+        # export_page returns True for skipped empty pages as well,
+        # so success_count includes them
+        success_count = sum(results.values())
+
+        logger.info(f"\n✅ Export completed!")
+        logger.info(f"   Total: {len(pages)} pages")
+        logger.info(f"   Processed: {success_count} pages")
+        logger.info(f"   Failed: {len(pages) - success_count} pages")
+        logger.info(f"\n📁 Output: {output_path.absolute()}")
 
     except ValueError as e:
-        print(f"❌ Configuration Error: {e}", file=sys.stderr)
+        logger.error(f"❌ Configuration Error: {e}")
         sys.exit(1)
     except requests.exceptions.HTTPError as e:
-        print(f"❌ API Error: {e}", file=sys.stderr)
+        logger.error(f"❌ API Error: {e}")
         sys.exit(1)
     except Exception as e:
         if verbose:
             import traceback
 
             traceback.print_exc()
-        print(f"❌ Error: {e}", file=sys.stderr)
+        logger.error(f"❌ Error: {e}")
         sys.exit(1)
 
 
@@ -5,6 +5,17 @@ Confluence URL parser utility
 import re
 from urllib.parse import urlparse
 
+# Single pass over the URL, never looking into the #fragment:
+# group 1: site (scheme://host; the scheme may be missing, in any case)
+# group 2: Format 1: .../pages/viewpage.action?pageId=123456 (old format)
+# group 3: Format 2: .../wiki/spaces/SPACE/pages/PAGE-ID/title (new format)
+_URL_RE = re.compile(
+    r"^((?:https?://)?[^/?#]*)[^#]*?(?:[?&]pageId=(\d+)|/pages/(\d+)(?:[/?#]|$))",
+    re.IGNORECASE,
+)
+# Fallback: numeric last path segment
+_LAST_SEGMENT_RE = re.compile(r"^((?:https?://)?[^/?#]*)[^?#]*/(\d+)/?(?:[?#]|$)", re.IGNORECASE)
+
 
 def parse_confluence_url(url: str) -> tuple[str, str]:
     """
@@ -22,43 +33,13 @@ def parse_confluence_url(url: str) -> tuple[str, str]:
         >>> parse_confluence_url("https://kinto-dev.atlassian.net/wiki/spaces/KIDPF/pages/3397648909/title")
         ('https://kinto-dev.atlassian.net', '3397648909')
     """
-    parsed = urlparse(url)
-
-    # Extract site URL
-    site = f"{parsed.scheme}://{parsed.netloc}"
-
-    # Extract pageId from URL
-    # Format 1: .../pages/viewpage.action?pageId=123456 (old format)
-    # Format 2: .../wiki/spaces/SPACE/pages/PAGE-ID/title (new format, pageId is 3rd segment)
-
-    # Try extracting from query parameter first (format 1)
-    if "pageId=" in url:
-        page_id = url.split("pageId=")[1].split("&")[0]
-        return site, page_id
-
-    # Handle Confluence Cloud format: /wiki/spaces/SPACE/pages/PAGE-ID/title
-    # Extract path and split, handling leading/trailing slashes
-    path = parsed.path.lstrip("/").rstrip("/")
-    path_parts = path.split("/")
-
-    # Format: /wiki/spaces/SPACE/pages/PAGE-ID/title
-    # Index:    0     1      2      3      4      5
-    if (
-        len(path_parts) >= 5
-        and path_parts[0] == "wiki"
-        and path_parts[1] == "spaces"
-        and path_parts[3] == "pages"
-    ):
-        # page_id is at index 4
-        potential_id = path_parts[4]
-        if potential_id.isdigit():
-            return site, potential_id
+    match = _URL_RE.search(url)
+    if match:
+        return match.group(1), match.group(2) or match.group(3)
 
-    # Fallback: try last path segment (old format)
-    if path_parts:
-        last_part = path_parts[-1]
-        if last_part.isdigit():
-            return site, last_part
+    match = _LAST_SEGMENT_RE.search(url)
+    if match:
+        return match.group(1), match.group(2)
 
     raise ValueError(f"Could not extract pageId from URL: {url}")
 